@@ -1,3 +1,4 @@
+import io
 import streamlit as st
 import pandas as pd
 from utils.segmentation import run_full_analysis # Impor fungsi analisis terlengkap
@@ -15,7 +16,7 @@ if uploaded_file is None:
     st.info("👋 Selamat datang! Silakan unggah file CSV data pelanggan melalui panel di sebelah kiri untuk memulai analisis.")
     st.stop()
 else:
-    file_path = uploaded_file
+    file_bytes = uploaded_file.getvalue()
 
 # --- Sidebar untuk Input ---
 st.sidebar.header("⚙️ Panel Kontrol Analisis")
@@ -34,7 +35,7 @@ tujuan_kampanye = st.sidebar.selectbox(
 
 if st.sidebar.button("🧠 Jalankan Analisis AI Lengkap", type="primary", use_container_width=True):
     with st.spinner("🧙‍♂️ Menganalisis data, menjalankan model AI, menyusun strategi, dan menulis laporan..."):
-        hasil = run_full_analysis(file_path, n_clusters, harga_produk, tujuan_kampanye)
+        hasil = run_full_analysis(file_bytes, n_clusters, harga_produk, tujuan_kampanye)
 
     if "error" in hasil:
         st.error(hasil["error"])
@@ -96,7 +97,8 @@ if st.sidebar.button("🧠 Jalankan Analisis AI Lengkap", type="primary", use_co
                 
         with tab4:
             st.header("📈 Evaluasi Model Klasterisasi")
-            st.pyplot(hasil["evaluation_plot"])
+            st.image(hasil["evaluation_plot"], use_container_width=True)
+            st.caption("Kurva evaluasi dihitung dengan MiniBatchKMeans sebagai diagnostik cepat; label klaster akhir tetap berasal dari K-Means penuh.")
             st.info(f"Klasterisasi dijalankan dengan **K = {n_clusters}**. Grafik di atas (Metode Elbow & Silhouette Score) dapat membantu dalam validasi pemilihan K.")
 
         with tab5:
@@ -108,10 +110,23 @@ if st.sidebar.button("🧠 Jalankan Analisis AI Lengkap", type="primary", use_co
             df_hasil = hasil["df_with_clusters"]
             st.dataframe(df_hasil, use_container_width=True)
             
-            @st.cache_data
+            @st.cache_data(max_entries=5)
+            def to_parquet_bytes(df_to_convert):
+                buf = io.BytesIO()
+                df_to_convert.to_parquet(buf, index=False, compression='snappy')
+                return buf.getvalue()
+
+            @st.cache_data(max_entries=5)
             def convert_df(df_to_convert):
                 return df_to_convert.to_csv(index=False).encode('utf-8')
             
+            st.download_button(
+                label="📥 Unduh Data Hasil (.parquet)",
+                data=to_parquet_bytes(df_hasil),
+                file_name=f"hasil_segmentasi_{n_clusters}_klaster.parquet",
+                mime="application/octet-stream",
+                use_container_width=True
+            )
             st.download_button(
                 label="📥 Unduh Data Hasil (.csv)",
                 data=convert_df(df_hasil),
@@ -1,17 +1,194 @@
+import io
+import hashlib
+from functools import reduce
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.cluster import KMeans
+import streamlit as st
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
-from sklearn.naive_bayes import GaussianNB
+import matplotlib
+matplotlib.use('Agg')  # Render tanpa GUI; gambar dikirim ke Streamlit sebagai PNG
 import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
+
+FITUR_NUMERIK = ['Age', 'Annual_Income', 'Total_Spend', 'Years_as_Customer', 'Num_of_Purchases', 'Average_Transaction_Amount', 'Num_of_Returns', 'Num_of_Support_Contacts', 'Satisfaction_Score', 'Last_Purchase_Days_Ago']
+FITUR_KATEGORIKAL = ['Gender', 'Email_Opt_In', 'Promotion_Response', 'Target_Churn']
+
+FITUR_BOOLEAN = ['Email_Opt_In', 'Target_Churn']
+NILAI_BOOLEAN = {'true': True, 'false': False, '1': True, '0': False}
+
+# Tipe data eksplisit untuk pd.read_csv: menghindari inferensi tipe pada kolom kategorikal.
+# Kolom boolean dibaca sebagai teks lalu dipetakan secara eksplisit oleh `_parse_boolean`.
+# Kolom numerik dibiarkan diinferensi; bilangan bulat diperkecil oleh `_optimize_dtypes`.
+DTYPES = {
+    'Gender': 'category',
+    'Email_Opt_In': 'str',
+    'Promotion_Response': 'category',
+    'Target_Churn': 'str',
+}
+
+def _parse_boolean(kolom):
+    """
+    Mengubah kolom True/False atau 1/0 (tanpa membedakan huruf besar/kecil) menjadi kategori boolean.
+
+    Args:
+        kolom (pd.Series): Kolom teks hasil pd.read_csv.
+
+    Returns:
+        pd.Series: Kolom bertipe category dengan kategori [False, True].
+
+    Raises:
+        ValueError: Jika ada nilai di luar True/False/1/0.
+    """
+    nilai = kolom.str.strip().str.lower().map(NILAI_BOOLEAN)
+    if nilai.isna().any():
+        contoh = kolom[nilai.isna()].iloc[0]
+        contoh = 'kosong' if pd.isna(contoh) else f"'{contoh}'"
+        raise ValueError(f"Kolom '{kolom.name}' hanya boleh berisi True/False atau 1/0, ditemukan nilai {contoh}.")
+    return nilai.astype(bool).astype(pd.CategoricalDtype([False, True]))
+
+def _optimize_dtypes(df):
+    """
+    Memperkecil tipe data kolom numerik bilangan bulat untuk menghemat memori.
+
+    Kolom bilangan bulat diturunkan ke int8/int16/... sesuai rentang nilainya (tanpa
+    kehilangan nilai); kolom desimal seperti nilai uang tetap float64 karena ikut
+    ditampilkan dan diekspor.
+
+    Args:
+        df (pd.DataFrame): Data pelanggan mentah.
+
+    Returns:
+        pd.DataFrame: DataFrame dengan kolom bilangan bulat yang lebih hemat memori.
+    """
+    for col in FITUR_NUMERIK:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=5)
+def _load_and_preprocess(file_bytes):
+    """
+    Membaca CSV dan menyiapkan matriks fitur untuk klasterisasi.
+
+    Di-cache berdasarkan isi file (bytes), sehingga unggahan yang sama tidak diproses ulang.
+
+    Args:
+        file_bytes (bytes): Isi mentah file CSV.
+
+    Returns:
+        tuple: (DataFrame asli, np.ndarray float32 fitur yang sudah diskalakan & di-encode).
+
+    Raises:
+        ValueError: Jika ada kolom yang dibutuhkan tidak ditemukan atau kolom boolean tidak valid.
+    """
+    # Customer_ID ikut dibaca (jika ada) agar data hasil tetap dapat dicocokkan dengan sumbernya
+    df = pd.read_csv(io.BytesIO(file_bytes), usecols=lambda col: col in FITUR_NUMERIK or col in FITUR_KATEGORIKAL or col == 'Customer_ID', dtype=DTYPES, engine='c')
+
+    # Penanganan jika kolom tidak ada
+    for col in FITUR_NUMERIK + FITUR_KATEGORIKAL:
+        if col not in df.columns:
+            raise ValueError(f"Kolom yang dibutuhkan '{col}' tidak ditemukan di dalam file CSV Anda.")
+    for col in FITUR_BOOLEAN:
+        df[col] = _parse_boolean(df[col])
+    df = _optimize_dtypes(df)
+
+    scaler = StandardScaler()
+    scaled_numerik = scaler.fit_transform(df[FITUR_NUMERIK])
+
+    # Kolom sudah bertipe category, sehingga get_dummies cukup memakai kode integernya
+    encoded_kategorikal = pd.get_dummies(df[FITUR_KATEGORIKAL], dtype=np.float32).to_numpy()
+
+    # Satu salinan float32 berurutan baris (C-order), siap dipakai langsung oleh KMeans
+    X = np.ascontiguousarray(np.hstack([scaled_numerik, encoded_kategorikal]), dtype=np.float32)
+    return df, X
+
+def _fit_one(n, X):
+    """
+    Melatih satu model MiniBatchKMeans untuk sweep evaluasi.
+
+    Args:
+        n (int): Jumlah klaster.
+        X (np.ndarray): Matriks fitur hasil pra-pemrosesan.
+
+    Returns:
+        tuple: (K, inertia, silhouette score).
+    """
+    kmeans_eval = MiniBatchKMeans(n_clusters=n, batch_size=1024, n_init=3, random_state=42).fit(X)
+    # Silhouette O(N^2): gunakan sampel acak agar tetap cepat untuk data besar
+    return n, kmeans_eval.inertia_, silhouette_score(X, kmeans_eval.labels_, sample_size=min(2000, len(X)), random_state=42)
+
+@st.cache_data(show_spinner=False, max_entries=5)
+def _elbow_sweep(file_hash, _X):
+    """
+    Menghitung Inertia dan Silhouette Score untuk K = 2..10.
+
+    Hanya untuk diagnostik, sehingga cukup memakai MiniBatchKMeans; label akhir
+    tetap dihasilkan oleh KMeans penuh di `_cluster_labels`.
+
+    Args:
+        file_hash (str): Hash isi file CSV, sebagai kunci cache.
+        _X (np.ndarray): Matriks fitur hasil pra-pemrosesan (tidak di-hash oleh Streamlit).
+
+    Returns:
+        tuple: (list K, list inertia, list silhouette score).
+    """
+    range_n_clusters = list(range(2, 11))
+    # Setiap K independen, sehingga dilatih paralel di semua core
+    hasil_sweep = Parallel(n_jobs=-1)(delayed(_fit_one)(n, _X) for n in range_n_clusters)
+    inertia = [i for _, i, _ in hasil_sweep]
+    silhouette_scores = [sil for _, _, sil in hasil_sweep]
+    return range_n_clusters, inertia, silhouette_scores
+
+@st.cache_data(show_spinner=False, max_entries=5)
+def _make_eval_plot(inertia, silhouette_scores, range_n_clusters):
+    """
+    Menggambar grafik Metode Elbow & Silhouette Score.
+
+    Args:
+        inertia (list): Inertia untuk setiap K.
+        silhouette_scores (list): Silhouette Score untuk setiap K.
+        range_n_clusters (list): Nilai K yang dievaluasi.
+
+    Returns:
+        bytes: Gambar PNG, siap ditampilkan dengan `st.image`.
+    """
+    fig_eval, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+    ax1.plot(range_n_clusters, inertia, marker='o')
+    ax1.set_title('Metode Elbow'); ax1.set_xlabel('Jumlah Klaster (K)'); ax1.set_ylabel('Inertia'); ax1.grid(True)
+    ax2.plot(range_n_clusters, silhouette_scores, marker='o', color='red')
+    ax2.set_title('Silhouette Score'); ax2.set_xlabel('Jumlah Klaster (K)'); ax2.set_ylabel('Silhouette Score'); ax2.grid(True)
+
+    buf = io.BytesIO()
+    fig_eval.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig_eval)
+    return buf.getvalue()
+
+# Satu entri per (file, K): cukup untuk beberapa file dengan K berbeda-beda
+@st.cache_data(show_spinner=False, max_entries=20)
+def _cluster_labels(file_hash, _X, n_clusters):
+    """
+    Melatih KMeans penuh untuk K terpilih dan mengembalikan label klasternya.
+
+    Args:
+        file_hash (str): Hash isi file CSV, sebagai kunci cache.
+        _X (np.ndarray): Matriks fitur hasil pra-pemrosesan.
+        n_clusters (int): Jumlah klaster yang dipilih.
+
+    Returns:
+        np.ndarray: Label klaster untuk setiap baris data.
+    """
+    # Data padat berdimensi rendah: Elkan memangkas perhitungan jarak lewat ketaksamaan segitiga
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10, algorithm='elkan')
+    return kmeans.fit_predict(_X)
 
 def run_full_analysis(file_path, n_clusters_chosen, harga_produk, tujuan_kampanye):
     """
     Menjalankan seluruh alur analisis segmentasi pelanggan, termasuk semua modul AI.
     
     Args:
-        file_path (str): Path ke file CSV data.
+        file_path (str | bytes): Path ke file CSV data, atau isi file CSV dalam bentuk bytes.
         n_clusters_chosen (int): Jumlah klaster yang dipilih.
         harga_produk (float): Harga produk dari input pengguna.
         tujuan_kampanye (str): Tujuan kampanye dari input pengguna.
@@ -22,61 +199,46 @@ def run_full_analysis(file_path, n_clusters_chosen, harga_produk, tujuan_kampany
     results = {}
     
     # --- 1. Persiapan Data ---
-    try:
-        df = pd.read_csv(file_path)
-    except FileNotFoundError:
-        return {"error": f"File tidak ditemukan di path: {file_path}"}
+    if isinstance(file_path, bytes):
+        file_bytes = file_path
+    else:
+        try:
+            with open(file_path, 'rb') as f:
+                file_bytes = f.read()
+        except FileNotFoundError:
+            return {"error": f"File tidak ditemukan di path: {file_path}"}
 
     # --- 2. Pra-pemrosesan ---
-    fitur_numerik = ['Age', 'Annual_Income', 'Total_Spend', 'Years_as_Customer', 'Num_of_Purchases', 'Average_Transaction_Amount', 'Num_of_Returns', 'Num_of_Support_Contacts', 'Satisfaction_Score', 'Last_Purchase_Days_Ago']
-    fitur_kategorikal = ['Gender', 'Email_Opt_In', 'Promotion_Response', 'Target_Churn']
-    
-    # Penanganan jika kolom tidak ada
-    for col in fitur_numerik + fitur_kategorikal:
-        if col not in df.columns:
-            return {"error": f"Kolom yang dibutuhkan '{col}' tidak ditemukan di dalam file CSV Anda."}
-
-    scaler = StandardScaler()
-    df_scaled_numerik = scaler.fit_transform(df[fitur_numerik])
-    df_scaled_numerik = pd.DataFrame(df_scaled_numerik, columns=fitur_numerik, index=df.index)
-
-    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)
-    df_encoded_kategorikal = encoder.fit_transform(df[fitur_kategorikal])
-    df_encoded_kategorikal = pd.DataFrame(df_encoded_kategorikal, columns=encoder.get_feature_names_out(fitur_kategorikal), index=df.index)
+    try:
+        df, X = _load_and_preprocess(file_bytes)
+    except ValueError as e:
+        return {"error": str(e)}
 
-    df_processed = pd.concat([df_scaled_numerik, df_encoded_kategorikal], axis=1)
+    # Rata-rata global dihitung sekali, dipakai oleh deskripsi, skor prioritas, dan aturan inferensi
+    mean_last, mean_years, mean_purchases, mean_avg = df[['Last_Purchase_Days_Ago', 'Years_as_Customer', 'Num_of_Purchases', 'Average_Transaction_Amount']].mean()
 
     # --- 3. Evaluasi & Klasterisasi ---
-    inertia = []
-    silhouette_scores = []
-    range_n_clusters = range(2, 11)
-    for n in range_n_clusters:
-        kmeans_eval = KMeans(n_clusters=n, random_state=42, n_init=10)
-        kmeans_eval.fit(df_processed)
-        inertia.append(kmeans_eval.inertia_)
-        silhouette_scores.append(silhouette_score(df_processed, kmeans_eval.labels_))
-            
-    fig_eval, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-    ax1.plot(range_n_clusters, inertia, marker='o')
-    ax1.set_title('Metode Elbow'); ax1.set_xlabel('Jumlah Klaster (K)'); ax1.set_ylabel('Inertia'); ax1.grid(True)
-    ax2.plot(range_n_clusters, silhouette_scores, marker='o', color='red')
-    ax2.set_title('Silhouette Score'); ax2.set_xlabel('Jumlah Klaster (K)'); ax2.set_ylabel('Silhouette Score'); ax2.grid(True)
-    results['evaluation_plot'] = fig_eval
+    # Kunci cache berupa hash file, sehingga matriks fitur tidak di-hash ulang di setiap interaksi
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    range_n_clusters, inertia, silhouette_scores = _elbow_sweep(file_hash, X)
+    results['evaluation_plot'] = _make_eval_plot(inertia, silhouette_scores, range_n_clusters)
 
-    kmeans = KMeans(n_clusters=n_clusters_chosen, random_state=42, n_init=10)
-    df['Cluster'] = kmeans.fit_predict(df_processed)
+    df['Cluster'] = _cluster_labels(file_hash, X, n_clusters_chosen)
     results['df_with_clusters'] = df
 
     # --- 4. Profiling & Deskripsi ---
-    cluster_profiles = df.groupby('Cluster').agg({
-        **{k: 'mean' for k in fitur_numerik}, 
-        **{k: (lambda x: x.mode()[0] if not x.mode().empty else 'N/A') for k in fitur_kategorikal}
-    }).round(2)
+    # Rata-rata numerik lewat jalur Cython groupby; hanya modus kategorikal yang memakai lambda
+    grouped = df.groupby('Cluster')
+    num_prof = grouped[FITUR_NUMERIK].mean()
+    cat_prof = grouped[FITUR_KATEGORIKAL].agg(lambda x: x.mode().iat[0] if not x.mode().empty else 'N/A')
+    cluster_profiles = pd.concat([num_prof, cat_prof], axis=1).round(2)
     results['cluster_profiles'] = cluster_profiles
+    # Baris profil sebagai dict biasa: jauh lebih murah daripada `.loc` per klaster
+    profiles = cluster_profiles.reset_index().to_dict('records')
 
     cluster_descriptions = {}
     for i in range(n_clusters_chosen):
-        p = cluster_profiles.loc[i]
+        p = profiles[i]
         desc = (
         f"**Klaster {i}**:\n"
         f"- Usia rata-rata: **{int(p['Age'])} tahun**\n"
@@ -84,85 +246,89 @@ def run_full_analysis(file_path, n_clusters_chosen, harga_produk, tujuan_kampany
         f"- Total pengeluaran: **Rp {p['Total_Spend'] / 1_000_000:.2f} Juta**\n"
         f"- Skor kepuasan: **{p['Satisfaction_Score']}**\n"
         f"- Dominan: **{'Pria' if p['Gender'] == 'Pria' else 'Wanita'}**\n"
-        f"- Frekuensi belanja: **{'sering' if p['Num_of_Purchases'] > df['Num_of_Purchases'].mean() else 'jarang'}**\n"
+        f"- Frekuensi belanja: **{'sering' if p['Num_of_Purchases'] > mean_purchases else 'jarang'}**\n"
         f"- Respons promosi: **'{p['Promotion_Response']}'**\n"
         f"- Status churn: **{'Cenderung Churn' if p['Target_Churn'] else 'Tidak Cenderung Churn'}**")
         cluster_descriptions[i] = desc
     results['cluster_descriptions'] = cluster_descriptions
 
     # --- 5. Modul AI Lanjutan ---
-    
-    gnb = GaussianNB().fit(df_processed, df['Cluster'])
 
     cf_mapping = {"sangat_tinggi": 0.9, "tinggi": 0.7, "sedang": 0.4, "rendah": 0.2, "pasti": 1.0, "hampir_pasti": 0.8, "kemungkinan_besar": 0.6, "mungkin": 0.4, "tidak_tahu": 0.0, "mungkin_tidak": -0.2, "kemungkinan_besar_tidak": -0.6, "hampir_pasti_tidak": -0.8, "pasti_tidak": -1.0}
     
     def calculate_cf_combination(cf1, cf2):
-        if cf1 >= 0 and cf2 >= 0: return cf1 + cf2 * (1 - cf1)
-        elif cf1 < 0 and cf2 < 0: return cf1 + cf2 * (1 + cf1)
-        else: return (cf1 + cf2) / (1 - min(abs(cf1), abs(cf2)))
-        
-    def hitung_skor_prioritas_cf(profile, harga_produk, tujuan_kampanye):
-        skor, cf_daya_beli, cf_spend, cf_kriteria_kampanye = 0, 0.0, 0.0, 0.0
-        if profile['Annual_Income'] > harga_produk * 10: skor += 3; cf_daya_beli = cf_mapping["sangat_tinggi"]
-        elif profile['Annual_Income'] > harga_produk * 5: skor += 2; cf_daya_beli = cf_mapping["tinggi"]
-        else: skor += 1; cf_daya_beli = cf_mapping["sedang"]
-        if profile['Total_Spend'] > harga_produk * 2: skor += 2; cf_spend = cf_mapping["tinggi"]
-        elif profile['Total_Spend'] > harga_produk: skor += 1; cf_spend = cf_mapping["sedang"]
-
-        if tujuan_kampanye == "meningkatkan penjualan umum":
-            if profile['Promotion_Response'] == 'Merespons': skor += 2; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["hampir_pasti"])
-            if profile['Satisfaction_Score'] >= 4: skor += 1; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["tinggi"])
-        elif tujuan_kampanye == "mencegah pelanggan churn":
-            if profile['Target_Churn']: skor += 3; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["pasti"])
-            if profile['Last_Purchase_Days_Ago'] > df['Last_Purchase_Days_Ago'].mean(): skor += 2; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["hampir_pasti"])
-        elif tujuan_kampanye == "meningkatkan loyalitas pelanggan":
-            if not profile['Target_Churn']: skor += 3; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["pasti"])
-            if profile['Years_as_Customer'] > df['Years_as_Customer'].mean(): skor += 2; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["hampir_pasti"])
-            if profile['Satisfaction_Score'] >= 4: skor += 1; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["tinggi"])
-        elif tujuan_kampanye == "mendapatkan pelanggan baru":
-            if profile['Promotion_Response'] == 'Merespons': skor += 2; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["hampir_pasti"])
-            if profile['Years_as_Customer'] < df['Years_as_Customer'].mean(): skor += 1; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["tinggi"])
-        elif tujuan_kampanye == "menjual produk tambahan":
-            if profile['Num_of_Purchases'] > df['Num_of_Purchases'].mean(): skor += 2; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["hampir_pasti"])
-            if profile['Promotion_Response'] == 'Merespons': skor += 1; cf_kriteria_kampanye = calculate_cf_combination(cf_kriteria_kampanye, cf_mapping["tinggi"])
-
-        cf_total = calculate_cf_combination(calculate_cf_combination(cf_daya_beli, cf_spend), cf_kriteria_kampanye)
+        # Tanpa percabangan Python: cf1/cf2 boleh skalar atau array (satu nilai per klaster)
+        cf1, cf2 = np.asarray(cf1, dtype=float), np.asarray(cf2, dtype=float)
+        positif = (cf1 >= 0) & (cf2 >= 0)
+        negatif = (cf1 < 0) & (cf2 < 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            campuran = (cf1 + cf2) / (1 - np.minimum(np.abs(cf1), np.abs(cf2)))
+        return np.where(positif, cf1 + cf2 - cf1 * cf2, np.where(negatif, cf1 + cf2 + cf1 * cf2, campuran))
+
+    def hitung_skor_prioritas_cf(profiles, harga_produk, tujuan_kampanye):
+        # Dievaluasi sekaligus untuk semua klaster; hasil berupa array sepanjang K
+        income = profiles['Annual_Income'].to_numpy()
+        spend = profiles['Total_Spend'].to_numpy()
+        merespons = (profiles['Promotion_Response'] == 'Merespons').to_numpy()
+        puas = (profiles['Satisfaction_Score'] >= 4).to_numpy()
+        churn = profiles['Target_Churn'].astype(bool).to_numpy()
+
+        skor = np.where(income > harga_produk * 10, 3, np.where(income > harga_produk * 5, 2, 1))
+        cf_daya_beli = np.where(income > harga_produk * 10, cf_mapping["sangat_tinggi"], np.where(income > harga_produk * 5, cf_mapping["tinggi"], cf_mapping["sedang"]))
+        skor = skor + np.where(spend > harga_produk * 2, 2, np.where(spend > harga_produk, 1, 0))
+        cf_spend = np.where(spend > harga_produk * 2, cf_mapping["tinggi"], np.where(spend > harga_produk, cf_mapping["sedang"], 0.0))
+
+        # (kondisi, bobot skor, CF) per tujuan kampanye; hanya tujuan terpilih yang dievaluasi
+        kriteria_kampanye = {
+            "meningkatkan penjualan umum": lambda: [(merespons, 2, cf_mapping["hampir_pasti"]), (puas, 1, cf_mapping["tinggi"])],
+            "mencegah pelanggan churn": lambda: [(churn, 3, cf_mapping["pasti"]), ((profiles['Last_Purchase_Days_Ago'] > mean_last).to_numpy(), 2, cf_mapping["hampir_pasti"])],
+            "meningkatkan loyalitas pelanggan": lambda: [(~churn, 3, cf_mapping["pasti"]), ((profiles['Years_as_Customer'] > mean_years).to_numpy(), 2, cf_mapping["hampir_pasti"]), (puas, 1, cf_mapping["tinggi"])],
+            "mendapatkan pelanggan baru": lambda: [(merespons, 2, cf_mapping["hampir_pasti"]), ((profiles['Years_as_Customer'] < mean_years).to_numpy(), 1, cf_mapping["tinggi"])],
+            "menjual produk tambahan": lambda: [((profiles['Num_of_Purchases'] > mean_purchases).to_numpy(), 2, cf_mapping["hampir_pasti"]), (merespons, 1, cf_mapping["tinggi"])],
+        }
+        kriteria = kriteria_kampanye.get(tujuan_kampanye, list)()
+        for kondisi, bobot, _ in kriteria:
+            skor = skor + np.where(kondisi, bobot, 0)
+        # CF 0 adalah elemen netral kombinasi: klaster yang tidak memenuhi kondisi tidak berubah
+        cf_kriteria_kampanye = reduce(calculate_cf_combination, [np.where(kondisi, cf, 0.0) for kondisi, _, cf in kriteria], np.zeros(len(profiles)))
+
+        cf_total = reduce(calculate_cf_combination, [cf_daya_beli, cf_spend, cf_kriteria_kampanye])
         return skor, cf_total
 
+    skor_klaster, cf_klaster = hitung_skor_prioritas_cf(cluster_profiles, harga_produk, tujuan_kampanye)
     prioritas_klaster = []
     for cid in range(n_clusters_chosen):
-        profile = cluster_profiles.loc[cid]
-        skor, cf = hitung_skor_prioritas_cf(profile, harga_produk, tujuan_kampanye)
-        prioritas_klaster.append({'Klaster_ID': cid, 'Skor_Prioritas': skor, 'CF_Prioritas': cf, 'Deskripsi': cluster_descriptions[cid]})
+        prioritas_klaster.append({'Klaster_ID': cid, 'Skor_Prioritas': int(skor_klaster[cid]), 'CF_Prioritas': float(cf_klaster[cid]), 'Deskripsi': cluster_descriptions[cid]})
     prioritas_klaster.sort(key=lambda x: x['Skor_Prioritas'], reverse=True)
     results['prioritas_klaster'] = prioritas_klaster
 
+    # Setiap aturan adalah predikat vektor atas seluruh `cluster_profiles` (satu nilai bool per klaster)
     marketing_rules_fc = [
-        {"IF": lambda p: p['Annual_Income'] > 10_000_000 and p['Satisfaction_Score'] >= 4, "THEN": "Kirim penawaran eksklusif/produk premium", "DESC": "Cocok untuk pelanggan berpenghasilan tinggi dan puas."},
-        {"IF": lambda p: p['Target_Churn'] and p['Last_Purchase_Days_Ago'] > df['Last_Purchase_Days_Ago'].mean(), "THEN": "Luncurkan kampanye retensi dengan diskon menarik", "DESC": "Prioritas tinggi untuk mencegah pelanggan beralih."},
-        {"IF": lambda p: p['Promotion_Response'] == 'Merespons' and p['Num_of_Purchases'] < df['Num_of_Purchases'].mean(), "THEN": "Tawarkan promosi untuk mendorong pembelian berulang", "DESC": "Manfaatkan respons promosi untuk meningkatkan frekuensi pembelian."},
-        {"IF": lambda p: p['Average_Transaction_Amount'] < df['Average_Transaction_Amount'].mean() and p['Num_of_Purchases'] > df['Num_of_Purchases'].mean(), "THEN": "Fokus pada up-selling atau cross-selling", "DESC": "Dorong peningkatan nilai keranjang belanja."},
+        {"IF": lambda P: (P['Annual_Income'] > 10_000_000) & (P['Satisfaction_Score'] >= 4), "THEN": "Kirim penawaran eksklusif/produk premium", "DESC": "Cocok untuk pelanggan berpenghasilan tinggi dan puas."},
+        {"IF": lambda P: P['Target_Churn'].astype(bool) & (P['Last_Purchase_Days_Ago'] > mean_last), "THEN": "Luncurkan kampanye retensi dengan diskon menarik", "DESC": "Prioritas tinggi untuk mencegah pelanggan beralih."},
+        {"IF": lambda P: (P['Promotion_Response'] == 'Merespons') & (P['Num_of_Purchases'] < mean_purchases), "THEN": "Tawarkan promosi untuk mendorong pembelian berulang", "DESC": "Manfaatkan respons promosi untuk meningkatkan frekuensi pembelian."},
+        {"IF": lambda P: (P['Average_Transaction_Amount'] < mean_avg) & (P['Num_of_Purchases'] > mean_purchases), "THEN": "Fokus pada up-selling atau cross-selling", "DESC": "Dorong peningkatan nilai keranjang belanja."},
     ]
     marketing_rules_bc = {
-        "meningkatkan loyalitas pelanggan": {"THEN_IF": lambda p: not p['Target_Churn'] and p['Years_as_Customer'] > df['Years_as_Customer'].mean() and p['Satisfaction_Score'] >= 4, "STRATEGY": "Kirim hadiah loyalitas atau undangan acara eksklusif."},
-        "mencegah pelanggan churn": {"THEN_IF": lambda p: p['Target_Churn'] and p['Last_Purchase_Days_Ago'] > df['Last_Purchase_Days_Ago'].mean(), "STRATEGY": "Luncurkan kampanye retensi agresif."},
-        "mendapatkan pelanggan baru": {"THEN_IF": lambda p: p['Promotion_Response'] == 'Merespons' and p['Years_as_Customer'] < df['Years_as_Customer'].mean(), "STRATEGY": "Iklankan melalui kanal yang menarik demografi klaster ini."},
+        "meningkatkan loyalitas pelanggan": {"THEN_IF": lambda P: ~P['Target_Churn'].astype(bool) & (P['Years_as_Customer'] > mean_years) & (P['Satisfaction_Score'] >= 4), "STRATEGY": "Kirim hadiah loyalitas atau undangan acara eksklusif."},
+        "mencegah pelanggan churn": {"THEN_IF": lambda P: P['Target_Churn'].astype(bool) & (P['Last_Purchase_Days_Ago'] > mean_last), "STRATEGY": "Luncurkan kampanye retensi agresif."},
+        "mendapatkan pelanggan baru": {"THEN_IF": lambda P: (P['Promotion_Response'] == 'Merespons') & (P['Years_as_Customer'] < mean_years), "STRATEGY": "Iklankan melalui kanal yang menarik demografi klaster ini."},
     }
     
+    # Matriks (K x R): baris = klaster, kolom = aturan forward chaining
+    rule_matrix = np.column_stack([rule["IF"](cluster_profiles).to_numpy(dtype=bool) for rule in marketing_rules_fc])
     fc_results = {}
     for item in prioritas_klaster:
-        cid = item['Klaster_ID']; profile = cluster_profiles.loc[cid]; fc_results[cid] = []
-        for rule in marketing_rules_fc:
-            if rule["IF"](profile): fc_results[cid].append(rule)
+        cid = item['Klaster_ID']
+        fc_results[cid] = [marketing_rules_fc[r] for r in np.flatnonzero(rule_matrix[cid])]
     results['forward_chaining_results'] = fc_results
     
     bc_results = []
     if tujuan_kampanye in marketing_rules_bc:
         rule = marketing_rules_bc[tujuan_kampanye]
-        for cid in range(n_clusters_chosen):
-            profile = cluster_profiles.loc[cid]
-            if rule["THEN_IF"](profile):
-                bc_results.append({'Klaster_ID': cid, 'Deskripsi': cluster_descriptions[cid], 'Strategi': rule["STRATEGY"]})
+        cocok = rule["THEN_IF"](cluster_profiles).to_numpy(dtype=bool)
+        for cid in np.flatnonzero(cocok):
+            bc_results.append({'Klaster_ID': int(cid), 'Deskripsi': cluster_descriptions[cid], 'Strategi': rule["STRATEGY"]})
     results['backward_chaining_results'] = bc_results
     
     def get_hierarchical_plan(strategy_type):
@@ -185,19 +351,19 @@ def run_full_analysis(file_path, n_clusters_chosen, harga_produk, tujuan_kampany
         results['hierarchical_plan'] = get_hierarchical_plan(top_strategy)
         results['top_strategy_for_plan'] = top_strategy
 
-    summary_text = f"""
+    # Potongan teks dikumpulkan dalam list lalu digabung sekali di akhir
+    summary_parts = [f"""
     Sistem ini berhasil melakukan **Segmentasi Pelanggan E-commerce** menggunakan algoritma K-Means, membagi total **{n_clusters_chosen}** segmen pelanggan unik.
-    \n#### 1. Profil Klaster yang Ditemukan:"""
-    for cid, desc in cluster_descriptions.items():
-        summary_text += f"\n- {desc}"
-    summary_text += f"""
-    \n\n#### 2. Rekomendasi Target Pasar Utama:
-    Berdasarkan harga produk **Rp {harga_produk:,.0f}** dan tujuan kampanye **'{tujuan_kampanye.upper()}'**, klaster berikut direkomendasikan:"""
-    for i, item in enumerate(prioritas_klaster):
-        summary_text += f"\n- **Prioritas {i+1}: Klaster {item['Klaster_ID']}** (Skor: {item['Skor_Prioritas']}, CF: {item['CF_Prioritas']:.2f})"
-    summary_text += """
-    \n\n#### 3. Penerapan Konsep Kecerdasan Buatan:
-    - **Teorema Bayes**: Model Naive Bayes dilatih untuk memperkirakan probabilitas $P(\text{Klaster} | \text{Fitur})$, memungkinkan penempatan pelanggan baru ke segmen yang paling mungkin.
+    \n#### 1. Profil Klaster yang Ditemukan:"""]
+    summary_parts.extend(f"- {desc}" for desc in cluster_descriptions.values())
+    summary_parts.append(f"""    \n\n#### 2. Rekomendasi Target Pasar Utama:
+    Berdasarkan harga produk **Rp {harga_produk:,.0f}** dan tujuan kampanye **'{tujuan_kampanye.upper()}'**, klaster berikut direkomendasikan:""")
+    summary_parts.extend(
+        f"- **Prioritas {i+1}: Klaster {item['Klaster_ID']}** (Skor: {item['Skor_Prioritas']}, CF: {item['CF_Prioritas']:.2f})"
+        for i, item in enumerate(prioritas_klaster)
+    )
+    summary_parts.append("""    \n\n#### 3. Penerapan Konsep Kecerdasan Buatan:
+    - **Teorema Bayes**: Model Naive Bayes dapat dilatih pada label klaster untuk memperkirakan probabilitas $P(\text{Klaster} | \text{Fitur})$, memungkinkan penempatan pelanggan baru ke segmen yang paling mungkin.
     - **Certainty Factor (CF)**: Setiap rekomendasi dilengkapi nilai CF yang merefleksikan tingkat keyakinan sistem terhadap relevansi klaster dengan tujuan kampanye.
     - **Inferensi (Forward & Backward Chaining)**:
         - **Forward Chaining (Data-driven):** Sistem secara otomatis menyarankan strategi pemasaran begitu karakteristik klaster diketahui.
@@ -206,8 +372,8 @@ def run_full_analysis(file_path, n_clusters_chosen, harga_produk, tujuan_kampany
     - **Konsep Pencarian (Heuristik & Buta)**: Metode Elbow dan `n_init=10` pada K-Means adalah bentuk pencarian untuk menemukan solusi optimal dan menghindari hasil yang suboptimal.
     - **Konsep Agen & Multi-Agen**: Sistem ini berfungsi sebagai 'Agen Analisis' yang outputnya dapat diintegrasikan ke dalam ekosistem 'Multi-Agen' (misal: Agen Pemasaran Email, Agen Iklan).
     \nSecara keseluruhan, proyek ini mengintegrasikan berbagai konsep inti AI untuk memberikan rekomendasi strategi pemasaran yang lebih cerdas, terjustifikasi, dan terstruktur.
-    """
-    results['final_summary'] = summary_text
+    """)
+    results['final_summary'] = "\n".join(summary_parts)
     
     return results
 pass